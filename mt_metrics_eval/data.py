@@ -1168,13 +1168,18 @@ def ComputeSigMatrix(
   if not k:
     return sig_matrix, draws_index, np.asarray(draws_list)
 
+  # Share resampling draws across all metric pairs.
+  swaps = None
+  if perm_test == 'scores' and n > 2:
+    swaps = stats.DrawPermutationSwaps(metric_corrs[metrics[0]], corr_fcn, k)
+
   def ComputePval(
       metric1, metric2
   ) -> tuple[str, str, float, list[tuple[float, float]]]:
     if perm_test == 'scores':
       pval, _, _, draws = stats.PermutationSigDiff(
           metric_corrs[metric2], metric_corrs[metric1], corr_fcn, average_by, k,
-          psd, replace_nans_with_zeros, **corr_fcn_args)
+          psd, replace_nans_with_zeros, swaps=swaps, **corr_fcn_args)
     elif perm_test == 'pairs':
       pval, _, _, draws = stats.PairwisePermutationSigDiff(
           metric_corrs[metric2], metric_corrs[metric1], variant, average_by, k,
@@ -135,6 +135,10 @@ flags.DEFINE_float(
 flags.DEFINE_float(
     'early_max', 0.50,
     'Early stop PERM-BOTH if pval > early_max at current block boundary.')
+flags.DEFINE_float(
+    'early_conf', 0.0,
+    'If non-zero, early stop PERM-BOTH only if a Wilson confidence interval '
+    'for pval at this level lies entirely below early_min or above early_max.')
 flags.DEFINE_string(
     'matrix_perm_test', 'scores',
     'Type of permutation test to run, one of "scores" or "pairs". The pairs '
@@ -161,7 +165,8 @@ flags.DEFINE_bool(
     'for non) for comparisons between current metric and all n metrics, in the '
     'same order as rows. Flags that affect this operation include all '
     '--matrix_* flags, along with --gold, --avg, --k, --k_block, --early_min, '
-    '--early_max, --replace_nans_with_zeros, and --use_outliers.')
+    '--early_max, --early_conf, --replace_nans_with_zeros, and '
+    '--use_outliers.')
 flags.DEFINE_string(
     'matrix_parallel', None,
     'Parallelize metric comparisions, and use this value as a temp file name.')
@@ -318,6 +323,7 @@ def PrintMatrix(new_metric_dirs):
       block_size=FLAGS.k_block,
       early_min=FLAGS.early_min,
       early_max=FLAGS.early_max,
+      early_conf=FLAGS.early_conf,
       replace_nans_with_zeros=FLAGS.replace_nans_with_zeros,
       perm_test=FLAGS.matrix_perm_test,
       corr_fcn_args=ast.literal_eval(FLAGS.matrix_corr_args)
@@ -423,7 +429,8 @@ def PrintComparison(res_base, res_comp, outfile):
     p, _, _, _ = stats.PermutationSigDiff(
         corr1, corr2, corr_fcn, FLAGS.avg, FLAGS.k,
         stats.PermutationSigDiffParams(
-            FLAGS.k_block, FLAGS.early_min, FLAGS.early_max),
+            FLAGS.k_block, FLAGS.early_min, FLAGS.early_max,
+            FLAGS.early_conf),
         FLAGS.replace_nans_with_zeros)
     return better, w, p
 
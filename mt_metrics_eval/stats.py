@@ -376,6 +376,48 @@ def _MatrixSufficientStatistics(
   return con, dis, t_x, t_y, t_xy
 
 
+# Vector size from which _CountInversions is faster than the inline Fenwick tree
+# loop in _FenwickTreeSufficientStatistics.
+_MIN_MERGE_INVERSIONS_SIZE = 40
+
+
+def _CountInversions(y: np.ndarray) -> int:
+  """Number of pairs i < j with y[i] > y[j], for a vector of non-negative ints.
+
+  This is a bottom-up merge sort count, with each level of merges done by a
+  single stable argsort rather than a Python loop. It takes O(n log^2 n) time
+  in the worst case, but each level is mostly presorted runs, so in practice it
+  is much faster than the Fenwick tree loop for long vectors.
+
+  Args:
+    y: Vector of non-negative integers, eg dense ranks.
+
+  Returns:
+    The number of inversions in y.
+  """
+  n = len(y)
+  pos = np.arange(n)
+  vals = np.asarray(y, dtype=np.int64)
+  scale = 2 * (int(vals.max()) + 1) if n else 2
+  count = 0
+  width = 1
+  while width < n:
+    # Sort each pair of adjacent blocks of size width by value, with left-block
+    # elements before right-block elements on equal values. For each right
+    # element, the left elements that don't precede it are the inversions.
+    parent = pos // (2 * width)
+    is_right = (pos // width) % 2
+    order = np.argsort(parent * scale + vals * 2 + is_right, kind='stable')
+    right = is_right[order].astype(bool)
+    lefts_before = np.cumsum(1 - is_right[order])[right]
+    p = parent[order][right]
+    lefts_in_parent = np.minimum(width, n - p * 2 * width)
+    count += int((lefts_in_parent - (lefts_before - p * width)).sum())
+    pos, vals = pos[order], vals[order]
+    width *= 2
+  return count
+
+
 def _FenwickTreeSufficientStatistics(
     x: ArrayLike,
     y: ArrayLike,
@@ -388,7 +430,8 @@ def _FenwickTreeSufficientStatistics(
   with the following changes:
   1) The cython function for computing discordant pairs is replaced by inline
      python. This works up to 2x faster for small vectors (< 50 elements), which
-     can be advantageous when processing many such vectors.
+     can be advantageous when processing many such vectors. Longer vectors use
+     a vectorized merge count instead, see `_CountInversions`.
   2) The function returns tau sufficient statistics required to compute any
      tau, not just tau-b/c.
 
@@ -416,25 +459,30 @@ def _FenwickTreeSufficientStatistics(
   x, y = x[perm], y[perm]
   x = np.r_[True, x[1:] != x[:-1]].cumsum(dtype=np.intp)
 
-  # count discordant pairs
-  sup = 1 + np.max(y)
-  # Use of `>> 14` improves cache performance of the Fenwick tree (see gh-10108)
-  arr = np.zeros(sup + ((sup - 1) >> 14), dtype=np.intp)
-  i, k, idx, dis = 0, 0, 0, 0
-  while i < x.size:
-    while k < x.size and x[i] == x[k]:
-      dis += i
-      idx = y[k]
-      while idx != 0:
-        dis -= arr[idx + (idx >> 14)]
-        idx = idx & (idx - 1)
-      k += 1
-    while i < k:
-      idx = y[i]
-      while idx < sup:
-        arr[idx + (idx >> 14)] += 1
-        idx += idx & -idx
-      i += 1
+  # count discordant pairs; y is sorted within runs of tied x, so these are
+  # exactly the inversions in y
+  if size >= _MIN_MERGE_INVERSIONS_SIZE:
+    dis = _CountInversions(y)
+  else:
+    sup = 1 + np.max(y)
+    # Use of `>> 14` improves cache performance of the Fenwick tree (see
+    # gh-10108)
+    arr = np.zeros(sup + ((sup - 1) >> 14), dtype=np.intp)
+    i, k, idx, dis = 0, 0, 0, 0
+    while i < x.size:
+      while k < x.size and x[i] == x[k]:
+        dis += i
+        idx = y[k]
+        while idx != 0:
+          dis -= arr[idx + (idx >> 14)]
+          idx = idx & (idx - 1)
+        k += 1
+      while i < k:
+        idx = y[i]
+        while idx < sup:
+          arr[idx + (idx >> 14)] += 1
+          idx += idx & -idx
+        i += 1
 
   obs = np.r_[True, (x[1:] != x[:-1]) | (y[1:] != y[:-1]), True]
   cnt = np.diff(np.nonzero(obs)[0]).astype('int64', copy=False)
@@ -692,6 +740,275 @@ class PermutationSigDiffParams:
   early_min: float = 0.02
   # Early stop if pval > early_max at current block boundary
   early_max: float = 0.5
+  # If non-zero, compare a Wilson confidence interval for pval at this level
+  # (eg 0.95) to early_min and early_max, rather than the point estimate. Stop
+  # only if the interval lies entirely outside [early_min, early_max].
+  early_conf: float = 0.0
+
+
+def _WilsonInterval(count: ArrayLike, n: ArrayLike, z: float):
+  """Wilson score interval for a binomial proportion count / n.
+
+  Works elementwise if count and n are arrays.
+  """
+  p = count / n
+  denom = 1 + z**2 / n
+  center = (p + z**2 / (2 * n)) / denom
+  half = z / denom * np.sqrt(p * (1 - p) / n + z**2 / (4 * n**2))
+  return center - half, center + half
+
+
+def _StopEarly(
+    count: ArrayLike, n: ArrayLike, params: PermutationSigDiffParams):
+  """Early stopping check after n draws, count of which exceeded delta.
+
+  Works elementwise if count and n are arrays.
+  """
+  if not params.early_conf:
+    pval = count / n
+    return (pval < params.early_min) | (pval > params.early_max)
+  z = scipy.stats.norm.ppf(0.5 + params.early_conf / 2)
+  lo, hi = _WilsonInterval(count, n, z)
+  return (hi < params.early_min) | (lo > params.early_max)
+
+
+# Upper bound on the number of elements in a batch of resampled score vectors,
+# used to limit memory when vectorizing PermutationSigDiff over large inputs.
+_MAX_BATCH_ELEMS = 1 << 22
+
+# Longest group for which _GroupedKendall is used in PermutationSigDiff. Its
+# cost per draw grows with the square of the group length, and above roughly
+# 150 elements it is slower than calling KendallVariants or kendalltau per draw.
+_MAX_GROUPED_KENDALL_LEN = 128
+
+
+class _GroupedPearson:
+  """Pearson correlations over consecutive groups, batched over score rows.
+
+  This factors out the computation that depends only on the gold scores, so
+  that it can be shared across many batches of metric scores.
+  """
+
+  def __init__(self, gold: np.ndarray, starts: np.ndarray):
+    """Initialize with gold scores and group boundaries.
+
+    Args:
+      gold: Vector of gold scores.
+      starts: Start indexes of consecutive groups in gold, followed by the total
+        length.
+    """
+    self._lens, self._idx = np.diff(starts), starts[:-1]
+    self.cost = len(gold)  # Elements processed per row of metric scores.
+    self._gold = self._Center(gold)
+    self._gold_ss = np.add.reduceat(self._gold**2, self._idx, axis=-1)
+
+  def _Center(self, scores: np.ndarray) -> np.ndarray:
+    means = np.add.reduceat(scores, self._idx, axis=-1) / self._lens
+    return scores - np.repeat(means, self._lens, axis=-1)
+
+  def __call__(self, mscores: np.ndarray) -> np.ndarray:
+    """Return correlations with gold for each row and group in mscores.
+
+    Args:
+      mscores: Matrix of metric scores, one row per resampling draw, with the
+        same number of columns as gold.
+
+    Returns:
+      Matrix of correlations with one row per row of mscores and one column per
+      group. Groups with constant scores get NaN correlations, as with
+      scipy.stats.pearsonr.
+    """
+    m = self._Center(mscores)
+    num = np.add.reduceat(m * self._gold, self._idx, axis=1)
+    den = np.sqrt(np.add.reduceat(m * m, self._idx, axis=1) * self._gold_ss)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      return num / den
+
+
+class _SwapPearson(_GroupedPearson):
+  """Pearson correlation over a single group, computed from swap masks.
+
+  PermutationSigDiff correlates gold with hybrids x2 + w * (x1 - x2) of two
+  metric score vectors, for 0/1 masks w. Since gold is centered, the sum of
+  gold * hybrid is linear in w, and since w * w = w, so are the sums of hybrid
+  values and squared values. Correlations for a batch of masks thus follow from
+  a single matrix product, without building the hybrid vectors.
+  """
+
+  def __init__(self, gold: np.ndarray):
+    super().__init__(gold, np.array([0, len(gold)]))
+
+  def _FromSums(self, sums: np.ndarray) -> np.ndarray:
+    """Correlations from rows of [sum(m), sum(gold * m), sum(m**2)]."""
+    ss = sums[:, 2] - sums[:, 0]**2 / self._lens[0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+      return (sums[:, 1] / np.sqrt(ss * self._gold_ss))[:, None]
+
+  def SwapCorrs(
+      self, w: np.ndarray, x1: np.ndarray, x2: np.ndarray
+      ) -> tuple[np.ndarray, np.ndarray]:
+    """Correlations for hybrids w * x1 + (1 - w) * x2 and (1 - w) * x1 + w * x2.
+
+    Args:
+      w: Matrix of 0/1 swap masks, one row per resampling draw.
+      x1: First vector of metric scores.
+      x2: Second vector of metric scores.
+
+    Returns:
+      Correlations for the first and second hybrids, each in the format
+      returned by __call__.
+    """
+    g, d = self._gold, x1 - x2
+    sums1 = np.array([x2.sum(), (g * x2).sum(), (x2 * x2).sum()])
+    sums1 = sums1 + w @ np.stack([d, g * d, x1 * x1 - x2 * x2], axis=1)
+    # The two hybrids always add up to x1 + x2, and their squares to
+    # x1**2 + x2**2.
+    totals = np.array([
+        (x1 + x2).sum(), (g * (x1 + x2)).sum(), (x1 * x1 + x2 * x2).sum()])
+    return self._FromSums(sums1), self._FromSums(totals - sums1)
+
+
+def _RankWithinGroups(scores: np.ndarray, starts: np.ndarray) -> np.ndarray:
+  """Average ranks along the last axis, computed separately for each group."""
+  lens = np.diff(starts)
+  if np.all(lens == lens[0]):
+    grouped = scores.reshape(scores.shape[:-1] + (len(lens), lens[0]))
+    return scipy.stats.rankdata(grouped, axis=-1).reshape(scores.shape)
+  ranks = np.empty(scores.shape)
+  for b, e in zip(starts[:-1], starts[1:]):
+    ranks[..., b: e] = scipy.stats.rankdata(scores[..., b: e], axis=-1)
+  return ranks
+
+
+class _GroupedSpearman(_GroupedPearson):
+  """Spearman correlations over consecutive groups, batched over score rows.
+
+  Gold scores are ranked once at construction; only metric scores get ranked
+  for each batch.
+  """
+
+  def __init__(self, gold: np.ndarray, starts: np.ndarray):
+    self._starts = starts
+    super().__init__(_RankWithinGroups(gold, starts), starts)
+
+  def __call__(self, mscores: np.ndarray) -> np.ndarray:
+    return super().__call__(_RankWithinGroups(mscores, self._starts))
+
+
+class _GroupedKendall:
+  """Kendall variants over consecutive groups, batched over score rows.
+
+  Pairwise orderings of gold scores are precomputed once as sign matrices, so
+  each resampled metric vector only requires building its own sign matrix and
+  comparing it to the gold one. This takes O(n^2) space per group, so it is
+  only suitable for short vectors, eg system-level scores or item-wise
+  averaging; see _MAX_GROUPED_KENDALL_LEN.
+  """
+
+  def __init__(
+      self, gold: np.ndarray, starts: np.ndarray, variant: str = 'b',
+      epsilon: float = 0.0):
+    """Initialize with gold scores, group boundaries, and KendallVariants args.
+
+    Args:
+      gold: Vector of gold scores.
+      starts: Start indexes of consecutive groups in gold, followed by the total
+        length.
+      variant: One of 'b', '23', or 'acc23', see KendallVariants.
+      epsilon: Threshold for metric score differences to count as ties, see
+        KendallVariants.
+    """
+    if variant not in ('b', '23', 'acc23'):
+      raise ValueError(f'Unsupported variant for _GroupedKendall: {variant}')
+    self._variant, self._epsilon = variant, epsilon
+    self._bounds = list(zip(starts[:-1], starts[1:]))
+    lens = np.diff(starts)
+    self.cost = int((lens**2).sum())  # Elements processed per row of scores.
+    self._group_shape = None
+    if np.all(lens == lens[0]):
+      self._group_shape = (len(lens), lens[0])
+    if self._group_shape:
+      self._gold_signs = [self._Signs(gold.reshape(self._group_shape), 0)]
+    else:
+      self._gold_signs = [self._Signs(gold[b: e], 0) for b, e in self._bounds]
+
+  @staticmethod
+  def _Signs(x: np.ndarray, epsilon: float) -> np.ndarray:
+    """Pairwise signs of differences along the last axis of x."""
+    diffs = x[..., None, :] - x[..., :, None]
+    return np.where(np.abs(diffs) <= epsilon, 0, np.sign(diffs))
+
+  def _Tau(self, mscores: np.ndarray, gold_signs: np.ndarray) -> np.ndarray:
+    """Kendall statistic over the last axis of mscores."""
+    n = mscores.shape[-1]
+    metric_signs = self._Signs(mscores, self._epsilon)
+    prods = metric_signs * gold_signs
+    metric_ties, gold_ties = metric_signs == 0, gold_signs == 0
+    # Each pair is counted twice, and the diagonal contributes n joint ties.
+    con = (prods > 0).sum(axis=(-2, -1)) / 2
+    dis = (prods < 0).sum(axis=(-2, -1)) / 2
+    tie_both = ((metric_ties & gold_ties).sum(axis=(-2, -1)) - n) / 2
+    xtie_only = (metric_ties & ~gold_ties).sum(axis=(-2, -1)) / 2
+    ytie_only = (~metric_ties & gold_ties).sum(axis=(-2, -1)) / 2
+    tot = n * (n - 1) / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+      if self._variant == 'b':
+        tau = (con - dis) / np.sqrt(
+            (tot - xtie_only - tie_both) * (tot - ytie_only - tie_both))
+      elif self._variant == '23':
+        tau = (con + tie_both - dis - xtie_only - ytie_only) / tot
+      else:
+        tau = (con + tie_both) / tot
+    tau[np.isnan(mscores).any(axis=-1)] = np.nan
+    return tau
+
+  def __call__(self, mscores: np.ndarray) -> np.ndarray:
+    """Return correlations with gold for each row and group in mscores."""
+    if self._group_shape:
+      grouped = mscores.reshape((len(mscores),) + self._group_shape)
+      return self._Tau(grouped, self._gold_signs[0])
+    return np.stack([
+        self._Tau(mscores[:, b: e], gs)
+        for (b, e), gs in zip(self._bounds, self._gold_signs)], axis=1)
+
+
+def _MakeGroupedCorrFcn(corr_fcn, gold, starts, **corr_fcn_args):
+  """Return a batched version of corr_fcn for PermutationSigDiff, or None.
+
+  Args:
+    corr_fcn: Correlation function, as passed to PermutationSigDiff.
+    gold: Vector of gold scores.
+    starts: Start indexes of consecutive groups in gold, followed by the total
+      length.
+    **corr_fcn_args: Optional extra arguments to corr_fcn.
+
+  Returns:
+    An object that maps a matrix of metric score rows to a matrix of per-row,
+    per-group correlations, and whose 'cost' attribute gives the number of
+    elements processed per row; or None if corr_fcn has no batched version for
+    the given arguments, or it would take too much space.
+  """
+  gold = np.asarray(gold, dtype=float)
+  if corr_fcn is scipy.stats.pearsonr and not corr_fcn_args:
+    if len(starts) == 2:
+      return _SwapPearson(gold)
+    return _GroupedPearson(gold, starts)
+  elif corr_fcn is scipy.stats.spearmanr and not corr_fcn_args:
+    return _GroupedSpearman(gold, starts)
+  elif corr_fcn in (scipy.stats.kendalltau, KendallVariants):
+    allowed_args = {'variant'} if corr_fcn is scipy.stats.kendalltau else {
+        'variant', 'epsilon'}
+    if (set(corr_fcn_args) - allowed_args or
+        corr_fcn_args.get('variant', 'b') not in ('b', '23', 'acc23') or
+        corr_fcn is scipy.stats.kendalltau and
+        corr_fcn_args.get('variant', 'b') != 'b'):
+      return None
+    lens = np.diff(starts)
+    if lens.max() > _MAX_GROUPED_KENDALL_LEN or (
+        (lens**2).sum() > _MAX_BATCH_ELEMS):
+      return None
+    return _GroupedKendall(gold, starts, **corr_fcn_args)
+  return None
 
 
 # pylint: disable=g-bare-generic
@@ -703,6 +1020,7 @@ def PermutationSigDiff(
     k: int = 1000,
     params: PermutationSigDiffParams = PermutationSigDiffParams(),
     replace_nans_with_zeros: bool = False,
+    swaps: np.ndarray | None = None,
     **corr_fcn_args
     ) -> tuple[float, float, int, list[tuple[float, float]]]:
   """Determine if there is a significant difference between two correlations.
@@ -713,6 +1031,15 @@ def PermutationSigDiff(
   the hypothesis that metric2 correlates better, or equivalently 1 minus the
   p-value for the hypothesis that metric1 correlates better.
 
+  Resampling draws are generated in batches. For correlation functions that
+  have a vectorized implementation (currently scipy.stats.pearsonr and
+  scipy.stats.spearmanr with no extra arguments, and scipy.stats.kendalltau
+  and KendallVariants when no group of scores to be correlated has more than
+  128 elements), correlations for all draws in a batch are computed with a
+  single set of numpy operations rather than one call per draw. Pearson
+  correlations with no averaging are computed from sufficient statistics that
+  need only one matrix product per batch.
+
   Args:
     corr1: Statistics for metric1.
     corr2: Statistics for metric2.
@@ -726,6 +1053,11 @@ def PermutationSigDiff(
     params: Additional minor parameters, see PermutationSigDiffParams.
     replace_nans_with_zeros: When averaging, replace NaNs with 0 rather than
       removing them from the average. No-op if corr_fcn is KendallWithTiesOpt.
+    swaps: Optional matrix of 0/1 swap masks to use instead of drawing random
+      ones, with at least k rows and one column per compared score, eg as
+      returned by DrawPermutationSwaps. Row i selects the scores that are
+      swapped between metrics on resampling run i. This allows the same draws
+      to be shared across many metric pairs.
     **corr_fcn_args: Optional extra arguments to corr_fcn.
 
   Returns:
@@ -741,12 +1073,23 @@ def PermutationSigDiff(
   bounds = list(zip(starts[:-1], starts[1:]))
 
   preprocs = None
-  if corr_fcn is KendallVariants:
-    preprocs = [KendallPreproc(gold[b: e]) for b, e in bounds]
-  elif corr_fcn is KendallWithTiesOpt:
+  grouped_corr_fcn = None
+  if corr_fcn is KendallWithTiesOpt:
     gold = corr1.gold_scores
     mscores1 = scipy.stats.zscore(corr1.metric_scores)
     mscores2 = scipy.stats.zscore(corr2.metric_scores)
+  else:
+    grouped_corr_fcn = _MakeGroupedCorrFcn(
+        corr_fcn, gold, starts, **corr_fcn_args)
+    if grouped_corr_fcn is None and corr_fcn is KendallVariants:
+      preprocs = [KendallPreproc(gold[b: e]) for b, e in bounds]
+
+  def _Average(vals):
+    if replace_nans_with_zeros:
+      vals = np.nan_to_num(vals)
+    else:
+      vals = np.asarray(vals)[~np.isnan(vals)]
+    return np.average(vals) if len(vals) else 0
 
   def _Corr(mscores):
     with warnings.catch_warnings():
@@ -762,30 +1105,114 @@ def PermutationSigDiff(
       else:
         vals = [corr_fcn(gold[b: e], mscores[b: e], **corr_fcn_args)[0]
                 for b, e in bounds]
-      if replace_nans_with_zeros:
-        vals = np.nan_to_num(vals)
-      else:
-        vals = np.asarray(vals)[~np.isnan(vals)]
-      return np.average(vals) if len(vals) else 0
+      return _Average(vals)
 
-  corrs = []
-  delta = _Corr(mscores2) - _Corr(mscores1)
-  i, large_delta_count = 1, 0
-  for i in range(1, k + 1):
-    w1 = np.random.binomial(1, 0.5, len(mscores1))
+  def _AverageRows(vals):
+    """Average each row in a matrix of per-group correlations."""
+    if replace_nans_with_zeros:
+      return np.nan_to_num(vals).mean(axis=1)
+    counts = (~np.isnan(vals)).sum(axis=1)
+    sums = np.nansum(vals, axis=1)
+    return np.divide(
+        sums, counts, out=np.zeros_like(sums), where=counts > 0)
+
+  def _BatchCorr(mscores):
+    """Average correlations for each row in a matrix of metric scores."""
+    if grouped_corr_fcn is None:
+      return np.array([_Corr(m) for m in mscores])
+    return _AverageRows(grouped_corr_fcn(mscores))
+
+  # Computing correlations from swap masks requires NaN-free scores.
+  swap_pearson = (
+      isinstance(grouped_corr_fcn, _SwapPearson) and
+      np.isfinite(mscores1).all() and np.isfinite(mscores2).all())
+
+  def _SwapCorrs(w1):
+    """Average correlations for both hybrids of metric scores given by w1."""
+    if swap_pearson:
+      vals1, vals2 = grouped_corr_fcn.SwapCorrs(w1, mscores1, mscores2)
+      return _AverageRows(vals1), _AverageRows(vals2)
     w2 = 1 - w1
     m1 = w1 * mscores1 + w2 * mscores2
     m2 = w2 * mscores1 + w1 * mscores2
-    c1, c2 = _Corr(m1), _Corr(m2)
-    corrs.append((c2, c1))
-    if c2 - c1 >= delta:
-      large_delta_count += 1
-    if i % params.block_size == 0:
-      pval = large_delta_count / i
-      if pval < params.early_min or pval > params.early_max:
-        break
+    return _BatchCorr(m1), _BatchCorr(m2)
+
+  n = len(mscores1)
+  if swap_pearson:
+    # Same computation as for resampled runs, so that draws identical to the
+    # original scores give exactly the same correlations.
+    (c1,), (c2,) = _SwapCorrs(np.ones((1, n)))
+  elif grouped_corr_fcn is not None:
+    c1, c2 = _BatchCorr(np.stack([mscores1, mscores2]))
+  else:
+    c1, c2 = _Corr(mscores1), _Corr(mscores2)
+  delta = c2 - c1
+
+  # Draw swap masks for a batch of resampling runs at a time. A batch can span
+  # several early-stopping blocks: running counts of large deltas give the
+  # p-value estimate at each block boundary within it, and the batch is cut
+  # short at the first boundary where we can stop. Without a batched corr_fcn,
+  # runs are computed one at a time, so batches end at the next boundary.
+  if swaps is not None and (swaps.shape[0] < k or swaps.shape[1] != n):
+    raise ValueError(
+        f'Swap masks have shape {swaps.shape}, expected at least {k} x {n}.')
+  cost = grouped_corr_fcn.cost if grouped_corr_fcn is not None else n
+  max_batch = max(1, _MAX_BATCH_ELEMS // max(cost, 1))
+  corrs = []
+  i, large_delta_count = 0, 0
+  while i < k:
+    size = min(k - i, max_batch)
+    if grouped_corr_fcn is None:
+      size = min(size, params.block_size - i % params.block_size)
+    if swaps is None:
+      w1 = np.random.binomial(1, 0.5, (size, n))
+    else:
+      w1 = swaps[i: i + size]
+    c1, c2 = _SwapCorrs(w1)
+    counts = large_delta_count + np.cumsum(c2 - c1 >= delta)
+    ends = np.arange(
+        params.block_size - i % params.block_size, size + 1, params.block_size)
+    stops = ends[_StopEarly(counts[ends - 1], i + ends, params)]
+    if len(stops):
+      size = int(stops[0])
+    corrs.extend(zip(c2[:size].tolist(), c1[:size].tolist()))
+    large_delta_count = int(counts[size - 1])
+    i += size
+    if len(stops):
+      break
+
+  return large_delta_count / max(i, 1), delta, i, corrs
+
+
+# Upper bound on the number of elements in a matrix of swap masks drawn by
+# DrawPermutationSwaps.
+_MAX_SWAP_ELEMS = 1 << 26
+
+
+def DrawPermutationSwaps(
+    corr: Correlation,
+    corr_fcn: Callable[..., tuple],
+    k: int = 1000,
+    ) -> np.ndarray | None:
+  """Draw swap masks that can be shared by calls to PermutationSigDiff.
 
-  return large_delta_count / i, delta, i, corrs
+  Args:
+    corr: Statistics for any of the metrics to be compared; only the gold
+      scores are used.
+    corr_fcn: Correlation function to be passed to PermutationSigDiff.
+    k: Number of resampling runs.
+
+  Returns:
+    A k x n int8 matrix of random 0/1 values for the swaps argument to
+    PermutationSigDiff, where n is the number of scores it compares; or None if
+    the matrix would take too much space.
+  """
+  n = len(corr.gold_scores)
+  if corr_fcn is not KendallWithTiesOpt:
+    n -= corr.none_count
+  if k * n > _MAX_SWAP_ELEMS:
+    return None
+  return np.random.randint(0, 2, (k, n), dtype=np.int8)
 
 
 def PairwisePermutationSigDiff(
@@ -887,10 +1314,9 @@ def PairwisePermutationSigDiff(
     corrs.append((c2, c1))
     if c2 - c1 >= delta:
       large_delta_count += 1
-      if i % params.block_size == 0:
-        pval = large_delta_count / i
-        if pval < params.early_min or pval > params.early_max:
-          break
+      if i % params.block_size == 0 and _StopEarly(
+          large_delta_count, i, params):
+        break
   return large_delta_count / i, delta, i, corrs
 
 
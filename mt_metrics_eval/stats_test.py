@@ -14,6 +14,7 @@
 # limitations under the License.
 """Tests for stats."""
 
+import warnings
 from mt_metrics_eval import stats
 import numpy as np
 import scipy.stats
@@ -249,6 +250,29 @@ class CorrelationFunctionsTest(unittest.TestCase):
     actual_acc = stats.KendallVariants(x, y, variant='acc23')[0]
     self.assertEqual(actual_acc, expected_acc)
 
+  def testKendallVariantsLongVectors(self):
+    # Long enough to count discordant pairs with _CountInversions.
+    rng = np.random.default_rng(3)
+    gold = rng.integers(0, 10, 300)
+    metric = rng.integers(0, 30, 300)
+    ref = kendall(gold, metric)[0]
+    self.assertAlmostEqual(stats.KendallVariants(gold, metric)[0], ref)
+    prep = stats.KendallPreproc(gold)
+    for variant in ['b', '23', 'acc23']:
+      tau = stats.KendallVariants(
+          None, metric, preproc=prep, variant=variant)[0]
+      pd = stats.PairwiseDiffs(metric)
+      matrix_tau = stats.KendallVariants(
+          None, None, preproc=prep, variant=variant, metric_preproc=pd)[0]
+      self.assertAlmostEqual(tau, matrix_tau)
+
+  def testCountInversions(self):
+    rng = np.random.default_rng(5)
+    for n in [0, 1, 2, 3, 7, 16, 41, 100]:
+      y = rng.integers(0, n // 3 + 2, n)
+      expected = sum(y[i] > y[j] for i in range(n) for j in range(i + 1, n))
+      self.assertEqual(stats._CountInversions(y), expected)
+
   def testKendallVariantsWithPositiveEpsilon(self):
     x = [1, 1, 1, 2, 2, 3, 4]
     y = [1, 1, 2, 2, 4, 3, 3]
@@ -358,6 +382,93 @@ class CorrelationFunctionsTest(unittest.TestCase):
     self.assertEqual(list(s2), [1, 2, 5])
 
 
+class GroupedPearsonTest(unittest.TestCase):
+
+  def testGroupedPearson(self):
+    gold = np.array([1, 2, 3, 4, 5, 5, 7, 8, 2], dtype=float)
+    mscores = np.array([[1, 2, 3, 3, 7, 3, 5, 5, 4],
+                        [2, 1, 2, 6, 8, 8, 7, 6, 1]], dtype=float)
+    starts = np.array([0, 3, 5, 9])
+    corrs = stats._GroupedPearson(gold, starts)(mscores)
+    self.assertEqual(corrs.shape, (2, 3))
+    for i, row in enumerate(mscores):
+      for j, (b, e) in enumerate(zip(starts[:-1], starts[1:])):
+        if e - b == 2 or np.all(row[b: e] == row[b]):
+          continue
+        self.assertAlmostEqual(corrs[i, j], pearson(gold[b: e], row[b: e])[0])
+
+  def testGroupedPearsonConstant(self):
+    corrs = stats._GroupedPearson(
+        np.array([1., 2., 3.]), np.array([0, 3]))(np.array([[2., 2., 2.]]))
+    self.assertTrue(np.isnan(corrs[0, 0]))
+
+  def testSwapPearson(self):
+    gold = np.array([1, 2, 3, 4, 5, 5, 7, 8, 2], dtype=float)
+    x1 = scipy.stats.zscore([1, 2, 3, 3, 7, 3, 5, 5, 4])
+    x2 = scipy.stats.zscore([2, 1, 2, 6, 8, 8, 7, 6, 1])
+    w = np.random.binomial(1, 0.5, (20, len(gold)))
+    swap_pearson = stats._SwapPearson(gold)
+    c1, c2 = swap_pearson.SwapCorrs(w, x1, x2)
+    self.assertEqual(c1.shape, (20, 1))
+    np.testing.assert_allclose(c1, swap_pearson(w * x1 + (1 - w) * x2))
+    np.testing.assert_allclose(c2, swap_pearson((1 - w) * x1 + w * x2))
+
+  def testGroupedSpearman(self):
+    gold = np.array([1, 2, 3, 4, 5, 5, 7, 8, 2], dtype=float)
+    mscores = np.array([[1, 2, 3, 3, 7, 3, 5, 5, 4],
+                        [2, 1, 2, 6, 8, 8, 7, 6, 1]], dtype=float)
+    for starts in np.array([0, 3, 6, 9]), np.array([0, 4, 9]):
+      corrs = stats._GroupedSpearman(gold, starts)(mscores)
+      for i, row in enumerate(mscores):
+        for j, (b, e) in enumerate(zip(starts[:-1], starts[1:])):
+          self.assertAlmostEqual(
+              corrs[i, j], scipy.stats.spearmanr(gold[b: e], row[b: e])[0])
+
+
+class GroupedKendallTest(unittest.TestCase):
+
+  def testGroupedKendall(self):
+    gold = np.array([1, 2, 3, 4, 5, 5, 7, 8, 2, 2, 6, 1], dtype=float)
+    mscores = np.array([[1, 2, 3, 3, 7, 3, 5, 5, 4, 4, 4, 0],
+                        [2, 1, 2, 6, 8, 8, 7, 6, 1, 3, 2, 5]], dtype=float)
+    for starts in np.array([0, 4, 8, 12]), np.array([0, 5, 12]):
+      for variant in 'b', '23', 'acc23':
+        for epsilon in 0, 1.5:
+          corrs = stats._GroupedKendall(gold, starts, variant, epsilon)(mscores)
+          for i, row in enumerate(mscores):
+            for j, (b, e) in enumerate(zip(starts[:-1], starts[1:])):
+              expected = stats.KendallVariants(
+                  gold[b: e], row[b: e], variant=variant, epsilon=epsilon)[0]
+              self.assertAlmostEqual(corrs[i, j], expected)
+      corrs = stats._GroupedKendall(gold, starts)(mscores)
+      for i, row in enumerate(mscores):
+        for j, (b, e) in enumerate(zip(starts[:-1], starts[1:])):
+          self.assertAlmostEqual(corrs[i, j], kendall(gold[b: e], row[b: e])[0])
+
+  def testMakeGroupedCorrFcn(self):
+    gold, starts = np.arange(6.0), np.array([0, 3, 6])
+    self.assertIsNotNone(stats._MakeGroupedCorrFcn(kendall, gold, starts))
+    self.assertIsNone(
+        stats._MakeGroupedCorrFcn(kendall, gold, starts, variant='c'))
+    self.assertIsNotNone(stats._MakeGroupedCorrFcn(
+        stats.KendallVariants, gold, starts, variant='acc23', epsilon=0.1))
+    self.assertIsNone(stats._MakeGroupedCorrFcn(
+        stats.KendallVariants, gold, starts, variant='c'))
+    self.assertIsNone(
+        stats._MakeGroupedCorrFcn(stats.KendallLike, gold, starts))
+    long_gold = np.arange(5000.0)
+    self.assertIsNone(stats._MakeGroupedCorrFcn(
+        kendall, long_gold, np.array([0, 5000])))
+    # Long groups are faster per draw than with _GroupedKendall.
+    gold = np.arange(300.0)
+    self.assertIsNone(stats._MakeGroupedCorrFcn(
+        kendall, gold, np.array([0, 300])))
+    self.assertIsNone(stats._MakeGroupedCorrFcn(
+        stats.KendallVariants, gold, np.array([0, 100, 300])))
+    self.assertIsNotNone(stats._MakeGroupedCorrFcn(
+        stats.KendallVariants, gold, np.array([0, 100, 200, 300])))
+
+
 class PermutationSigDiffTest(unittest.TestCase):
 
   gold = [1, 2, 3, 4, 5, 5, 7, 8]
@@ -389,6 +500,30 @@ class PermutationSigDiffTest(unittest.TestCase):
     self.assertEqual(len(c), k)  # pylint: disable=g-generic-assert
     self.assertAlmostEqual(sum(c2 - c1 >= delta for c2, c1 in c) / k, p)
 
+  def testPearsonNoAvgWithConfidentEarlyStop(self):
+    # A point estimate of 0 after 10 draws stops immediately, but a 95%
+    # confidence interval is too wide to rule out p >= early_min.
+    params = stats.PermutationSigDiffParams(block_size=10, early_max=0.2)
+    self.assertTrue(stats._StopEarly(0, 10, params))
+    params.early_conf = 0.95
+    self.assertFalse(stats._StopEarly(0, 10, params))
+    self.assertTrue(stats._StopEarly(0, 1000, params))
+    self.assertTrue(stats._StopEarly(500, 1000, params))
+    self.assertFalse(stats._StopEarly(200, 1000, params))
+
+    p, _, k, c = stats.PermutationSigDiff(
+        self.corr1, self.corr2, pearson, 'none', 1000, params)
+    self.assertEqual(len(c), k)  # pylint: disable=g-generic-assert
+    self.assertEqual(k % 10, 0)
+    self.assertGreater(p, 0)
+
+  def testWilsonInterval(self):
+    lo, hi = stats._WilsonInterval(50, 100, 1.96)
+    self.assertAlmostEqual(lo, 0.4038, places=4)
+    self.assertAlmostEqual(hi, 0.5962, places=4)
+    lo, hi = stats._WilsonInterval(0, 100, 0)
+    self.assertEqual((lo, hi), (0, 0))
+
   def testPearsonSysNoEarlyStop(self):
     cf = stats.AverageCorrelation(pearson, 4, average_by='sys')
     delta = cf(self.gold, self.metric2)[0] - cf(self.gold, self.metric1)[0]
@@ -417,6 +552,86 @@ class PermutationSigDiffTest(unittest.TestCase):
     self.assertAlmostEqual(d, delta)
     self.assertEqual(k, 1000)
 
+  def testBatchedMatchesUnbatched(self):
+    for corr_fcn in (pearson, scipy.stats.spearmanr, kendall,
+                     stats.KendallVariants):
+      # Wrapping corr_fcn disables the batched implementation.
+      def unbatched_corr_fcn(x, y, corr_fcn=corr_fcn):
+        return corr_fcn(x, y)
+      for average_by in 'none', 'sys', 'item':
+        np.random.seed(11)
+        p1, d1, k1, c1 = stats.PermutationSigDiff(
+            self.corr1, self.corr2, corr_fcn, average_by, 100)
+        np.random.seed(11)
+        p2, d2, k2, c2 = stats.PermutationSigDiff(
+            self.corr1, self.corr2, unbatched_corr_fcn, average_by, 100)
+        self.assertAlmostEqual(p1, p2)
+        self.assertAlmostEqual(d1, d2)
+        self.assertEqual(k1, k2)
+        np.testing.assert_allclose(c1, c2, atol=1e-9)
+
+  def testBatchedEarlyStopMatchesUnbatched(self):
+    # Batches span many early-stopping blocks, and get cut at the first block
+    # where we can stop; unbatched runs stop at each block boundary.
+    def unbatched_pearson(x, y):
+      return pearson(x, y)
+    for early_conf in 0, 0.9:
+      params = stats.PermutationSigDiffParams(
+          block_size=10, early_max=0.2, early_conf=early_conf)
+      np.random.seed(17)
+      swaps = np.random.binomial(1, 0.5, (1000, len(self.gold)))
+      p1, d1, k1, c1 = stats.PermutationSigDiff(
+          self.corr1, self.corr2, pearson, 'none', 1000, params, swaps=swaps)
+      p2, d2, k2, c2 = stats.PermutationSigDiff(
+          self.corr1, self.corr2, unbatched_pearson, 'none', 1000, params,
+          swaps=swaps)
+      self.assertLess(k1, 1000)
+      self.assertEqual(k1 % 10, 0)
+      self.assertEqual(k1, k2)
+      self.assertAlmostEqual(p1, p2)
+      self.assertAlmostEqual(d1, d2)
+      np.testing.assert_allclose(c1, c2, atol=1e-9)
+
+  def testPearsonNoAvgWithNans(self):
+    # NaN scores (from constant metric1) disable the swap mask computation.
+    def unbatched_pearson(x, y):
+      return pearson(x, y)
+    corr1 = stats.Correlation(4, self.gold, [3] * len(self.gold))
+    with warnings.catch_warnings():
+      warnings.simplefilter('ignore')
+      np.random.seed(19)
+      p1, d1, _, _ = stats.PermutationSigDiff(
+          corr1, self.corr2, pearson, 'none', 100)
+      np.random.seed(19)
+      p2, d2, _, _ = stats.PermutationSigDiff(
+          corr1, self.corr2, unbatched_pearson, 'none', 100)
+    self.assertAlmostEqual(d1, pearson(self.gold, self.metric2)[0])
+    self.assertAlmostEqual(d1, d2)
+    self.assertEqual(p1, p2)
+
+  def testSharedSwaps(self):
+    # Swap masks drawn up front give the same results as drawing them on the
+    # fly from the same random state.
+    np.random.seed(13)
+    swaps = np.random.binomial(1, 0.5, (1000, len(self.gold)))
+    np.random.seed(13)
+    expected = stats.PermutationSigDiff(
+        self.corr1, self.corr2, pearson, 'sys', 1000)
+    actual = stats.PermutationSigDiff(
+        self.corr1, self.corr2, pearson, 'sys', 1000, swaps=swaps)
+    self.assertEqual(actual, expected)
+
+    swaps = stats.DrawPermutationSwaps(self.corr1, pearson, 1000)
+    self.assertEqual(swaps.shape, (1000, len(self.gold)))
+    self.assertEqual(
+        stats.PermutationSigDiff(
+            self.corr1, self.corr2, pearson, 'none', 1000, swaps=swaps),
+        stats.PermutationSigDiff(
+            self.corr1, self.corr2, pearson, 'none', 1000, swaps=swaps))
+    with self.assertRaises(ValueError):
+      stats.PermutationSigDiff(
+          self.corr1, self.corr2, pearson, 'none', 1000, swaps=swaps[:, 1:])
+
   def testKendallItemWithEarlyStop(self):
     cf = stats.AverageCorrelation(kendall, 4, average_by='item')
     delta = cf(self.gold, self.metric2)[0] - cf(self.gold, self.metric1)[0]
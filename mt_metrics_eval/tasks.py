@@ -30,11 +30,16 @@ to summarize the performance of different metrics across tasks.
 
 from __future__ import annotations
 
+import concurrent.futures
 import dataclasses
+import functools
 import io
 import itertools
 import json
+import os
+import tempfile
 from typing import Any
+import weakref
 from mt_metrics_eval import data
 from mt_metrics_eval import meta_info
 from mt_metrics_eval import stats
@@ -66,6 +71,27 @@ def MatrixString(corr_ranks, matrix, pval=0.05, probs=False):
   return fh.getvalue()
 
 
+@functools.lru_cache(maxsize=None)
+def _LoadEvalSet(test_set: str, lang: str) -> data.EvalSet:
+  """Load an EvalSet with stored metric scores, cached across calls."""
+  return data.EvalSet(test_set, lang, read_stored_metric_scores=True)
+
+
+# EvalSets available to Task.Run in TaskSet.Run worker processes.
+_WORKER_EVAL_SET_DICT = None
+
+
+def _InitWorker(eval_set_dict):
+  global _WORKER_EVAL_SET_DICT
+  _WORKER_EVAL_SET_DICT = eval_set_dict
+  # Forked workers inherit the parent's random state; give each its own.
+  np.random.seed()
+
+
+def _RunTask(task: Task) -> TaskResults:
+  return task.Run(_WORKER_EVAL_SET_DICT)
+
+
 def _FormatMetric(basename, status, noref):
   status_str = {'primary': '', 'contrastive': '*', 'baseline': '_'}
   noref_str = {True: '[noref]', False: ''}
@@ -282,9 +308,14 @@ class Task:
   block_size: int = 100
   early_min: float = 0.02
   early_max: float = 0.50
+  early_conf: float = 0.0
   replace_nans_with_zeros: bool = False
   perm_test: str = 'scores'
   corr_fcn_args: dict[str, Any] | None = None
+  # Either 'float64' or 'float32', the precision in which the significance
+  # matrix and resampling draws are kept in TaskResults. Correlations and ranks
+  # are always computed in full precision.
+  precision: str = 'float64'
 
   def _StdGold(self, lang, level):
     return meta_info.DATA[self.test_set][lang].std_gold[level]
@@ -297,6 +328,7 @@ class Task:
     test_set, lang, level = self.test_set, self.lang, self.level
     assert test_set in meta_info.DATA
     assert self.corr_fcn in CORRELATION_FUNCTIONS
+    assert self.precision in ('float64', 'float32'), self.precision
 
     sub_langs = lang.split(',')
     if self.corr_fcn == 'accuracy':
@@ -335,8 +367,9 @@ class Task:
       assert isinstance(self.close_refs, set)
     if self.corr_fcn_args is None:
       self.corr_fcn_args = {}
-    # Canonical order for comparisons.
-    self.corr_fcn_args = dict(sorted(self.corr_fcn_args.items()))
+    else:
+      # Canonical order for comparisons.
+      self.corr_fcn_args = dict(sorted(self.corr_fcn_args.items()))
 
   @property
   def name(self):
@@ -347,16 +380,25 @@ class Task:
     return f'{getattr(self, attr)}'.replace(' ', '')
 
   def Run(self, eval_set_dict=None, parallel_file=None) -> TaskResults:
-    """Generate metric correlations and pairwise significance results."""
+    """Generate metric correlations and pairwise significance results.
+
+    Args:
+      eval_set_dict: Maps (test-set, lp) pairs to EvalSets. If None, EvalSets
+        are loaded as needed and cached for use by later calls.
+      parallel_file: Passed to data.CompareMetrics*; see there.
+
+    Returns:
+      TaskResults object containing results of this run.
+    """
 
     def _Evs(lp):
       if eval_set_dict is None:
-        return data.EvalSet(self.test_set, lp, read_stored_metric_scores=True)
+        return _LoadEvalSet(self.test_set, lp)
       else:
         return eval_set_dict[(self.test_set, lp)]
 
     psd = stats.PermutationSigDiffParams(
-        self.block_size, self.early_min, self.early_max)
+        self.block_size, self.early_min, self.early_max, self.early_conf)
 
     if self.corr_fcn == 'accuracy':
       evs_list = [_Evs(lp) for lp in self.lang.split(',')]
@@ -390,8 +432,49 @@ class Task:
     return TaskResults(self, res)
 
 
+# TaskResults arrays at least this large are kept in temporary files rather
+# than in memory.
+_MAX_IN_MEMORY_BYTES = 1 << 20
+
+
+class _DiskArray:
+  """Array stored in a temporary file, memory-mapped read-only on access.
+
+  The file is deleted when this object is garbage collected. Pickling saves the
+  array contents, so the array can be passed between processes.
+  """
+
+  def __init__(self, array: np.ndarray):
+    fd, self.path = tempfile.mkstemp(suffix='.npy')
+    with os.fdopen(fd, 'wb') as f:
+      np.save(f, array)
+    weakref.finalize(self, os.remove, self.path)
+
+  def Load(self) -> np.ndarray:
+    return np.load(self.path, mmap_mode='r')
+
+  def __reduce__(self):
+    return _DiskArray, (np.array(self.Load()),)
+
+
+def _StoreArray(array):
+  """Wrap array in a _DiskArray if it is too large to keep in memory."""
+  if array is not None and np.asarray(array).nbytes >= _MAX_IN_MEMORY_BYTES:
+    return _DiskArray(np.asarray(array))
+  return array
+
+
+def _LoadArray(stored):
+  return stored.Load() if isinstance(stored, _DiskArray) else stored
+
+
 class TaskResults:
-  """Results from running a Task."""
+  """Results from running a Task.
+
+  Large significance matrices and resampling draws are kept in temporary files
+  and memory-mapped read-only when accessed, so that sets of many results don't
+  have to hold all of them in memory.
+  """
 
   def __init__(self, task=None, compare_metrics_results=None):
     """Construct from task and results from CompareMetrics*()."""
@@ -401,14 +484,35 @@ class TaskResults:
       self.name, self.pval = '', 0
 
     if compare_metrics_results:
+      corr_ranks, matrix, draws_index, draws_list = compare_metrics_results
+      if task and task.precision != 'float64':
+        matrix = np.asarray(matrix, dtype=task.precision)
+        if draws_list is not None:
+          draws_list = np.asarray(draws_list, dtype=task.precision)
       (
           self.corr_ranks, self.matrix, self.draws_index, self.draws_list
-      ) = compare_metrics_results  # type: ignore
+      ) = corr_ranks, matrix, draws_index, draws_list
     else:
       (
           self.corr_ranks, self.matrix, self.draws_index, self.draws_list
       ) = {}, np.array([]), np.array([]), np.array([])
 
+  @property
+  def matrix(self) -> np.ndarray:
+    return _LoadArray(self._matrix)
+
+  @matrix.setter
+  def matrix(self, matrix: np.ndarray):
+    self._matrix = _StoreArray(matrix)
+
+  @property
+  def draws_list(self) -> np.ndarray:
+    return _LoadArray(self._draws_list)
+
+  @draws_list.setter
+  def draws_list(self, draws_list: np.ndarray):
+    self._draws_list = _StoreArray(draws_list)
+
   def __eq__(self, other):
     return (self.name == other.name and
             self.pval == other.pval and
@@ -420,7 +524,13 @@ class TaskResults:
   @property
   def attr_vals(self) -> dict[str, str]:
     """Return attr:val representation of task."""
-    return dict(av.split('=') for av in self.name.split())
+    attr_vals = dict(av.split('=') for av in self.name.split())
+    if attr_vals:
+      # Names from older versions lack attributes added since; these take their
+      # default values.
+      for field in dataclasses.fields(Task):
+        attr_vals.setdefault(field.name, f'{field.default}'.replace(' ', ''))
+    return attr_vals
 
   @property
   def metrics(self) -> list[str]:
@@ -448,11 +558,17 @@ class TaskResults:
     if isinstance(metric, int): metric = self.metrics[metric]
     return self.corr_ranks[metric][1]
 
+  def _MatrixPval(self):
+    """pval in the precision of the significance matrix, for comparisons."""
+    if self.matrix.dtype == np.float32:
+      return np.float32(self.pval)
+    return self.pval
+
   def Sig(self, m1, m2) -> bool:
     """Corr(m1) - Corr(m2) is significant. Difference assumed to be >= 0."""
     if isinstance(m1, str): m1 = self.metrics.index(m1)
     if isinstance(m2, str): m2 = self.metrics.index(m2)
-    return self.matrix[m1, m2] < self.pval
+    return self.matrix[m1, m2] < self._MatrixPval()
 
   def Draws(self, m1, m2) -> np.ndarray:
     """List of resampling draws for m1 versus m2."""
@@ -471,28 +587,28 @@ class TaskResults:
   def Str(self, probs=False):
     """Return a string representation of metric ranking and significance."""
     return MatrixString(
-        self.corr_ranks, self.matrix, self.pval, probs=probs)
+        self.corr_ranks, self.matrix, self._MatrixPval(), probs=probs)
 
   def Save(self, filename):
     """Save results to filename.json and filename.npz."""
 
     with open(f'{filename}.json', 'w') as f:
-      elems = (self.name, self.pval, self.corr_ranks, self.matrix.tolist())
-      json.dump(elems, f)
+      json.dump((self.name, self.pval, self.corr_ranks), f)
     with open(f'{filename}.npz', 'wb') as f:
       np.savez_compressed(
-          f, draws_index=self.draws_index, draws_list=self.draws_list)
+          f, matrix=self.matrix, draws_index=self.draws_index,
+          draws_list=self.draws_list)
 
   def Load(self, filename):
     """Load results previously saved to filename."""
     with open(f'{filename}.json') as f:
-      name, pval, corr_ranks, matrix = json.load(f)
-    self.name = name
-    self.pval = pval
-    self.corr_ranks = corr_ranks
-    self.matrix = np.asarray(matrix)
+      elems = json.load(f)
+    # Older versions stored the significance matrix in the json file.
+    matrix = np.asarray(elems.pop()) if len(elems) == 4 else None
+    self.name, self.pval, self.corr_ranks = elems
     with open(f'{filename}.npz', 'rb') as f:
       a = np.load(f)
+      self.matrix = a['matrix'] if matrix is None else matrix
       self.draws_index = a['draws_index']
       self.draws_list = a['draws_list']
     return self
@@ -543,7 +659,8 @@ class TaskSet:
     self.tasks.append(task)
 
   def Run(self,
-          eval_set_dict: dict[tuple[str, str], data.EvalSet] | None = None
+          eval_set_dict: dict[tuple[str, str], data.EvalSet] | None = None,
+          max_workers: int | None = 1,
           ) -> TaskSetResults:
     """Run all tasks.
 
@@ -552,6 +669,10 @@ class TaskSet:
         modify EvalSets, for instance by controlling the metrics that will be
         evaluated using AddMetricsFromDir() or AddMetric(). Any (test-set, lp)
         combinations missing from eval_set_dict will be added automatically.
+      max_workers: Number of worker processes to run tasks in. If 1, tasks are
+        run sequentially in the current process; if None, use one worker per
+        CPU. Each worker receives its own copy of all EvalSets, so memory use
+        grows with the number of workers.
 
     Returns:
       TaskSetResults object containing results of this run.    
@@ -559,7 +680,15 @@ class TaskSet:
     if eval_set_dict:
       self.eval_set_dict = eval_set_dict.copy()
     self._BuildEvalSetDict()
-    return TaskSetResults([task.Run(self.eval_set_dict) for task in self.tasks])
+    if max_workers is None:
+      max_workers = os.cpu_count()
+    if max_workers == 1 or len(self.tasks) <= 1:
+      return TaskSetResults(
+          [task.Run(self.eval_set_dict) for task in self.tasks])
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_InitWorker,
+        initargs=(self.eval_set_dict,)) as executor:
+      return TaskSetResults(list(executor.map(_RunTask, self.tasks)))
 
 
 class TaskSetResults:
@@ -629,14 +758,22 @@ class TaskSetResults:
     """
     if weights is None:
       weights = [1 / len(self)] * len(self)
-    ranks = {}
-    for res, weight in zip(self.results, weights):
-      for metric in res.metrics:
-        if metric not in ranks:
-          ranks[metric] = []
-        ranks[metric].append(res.Rank(metric) * weight)
-    ranks = {m: sum(ranks[m]) for m in ranks if len(ranks[m]) == len(self)}
-    return dict(sorted(ranks.items(), key=lambda x: x[1]))
+    # Metrics x tasks matrix of ranks, with NaN for metrics missing from a task.
+    metrics = list(
+        dict.fromkeys(m for res in self.results for m in res.metrics))
+    metric_index = {m: i for i, m in enumerate(metrics)}
+    ranks = np.full((len(metrics), len(self)), np.nan)
+    for t, res in enumerate(self.results):
+      rows = [metric_index[m] for m in res.metrics]
+      ranks[rows, t] = [rank for _, rank in res.corr_ranks.values()]
+    # Accumulate task by task, so sums match adding weighted ranks in order.
+    avg_ranks = np.zeros(len(metrics))
+    for t, weight in enumerate(weights):
+      avg_ranks += ranks[:, t] * weight
+    present = np.flatnonzero(~np.isnan(avg_ranks))
+    order = present[np.argsort(avg_ranks[present], kind='stable')]
+    avg_ranks = avg_ranks.tolist()
+    return {metrics[i]: avg_ranks[i] for i in order.tolist()}
 
   def AverageCorrs(self, weights=None) -> dict[str, float]:
     """Return sorted average weighted correlation of metrics over all tasks.
@@ -14,6 +14,11 @@
 # limitations under the License.
 """Tests for stats."""
 
+import gc
+import json
+import os
+import pickle
+import tempfile
 from mt_metrics_eval import tasks
 import numpy as np
 import unittest
@@ -101,7 +106,99 @@ class TaskTest(unittest.TestCase):
 
 class TaskResultsTest(unittest.TestCase):
 
-  # TODO(fosterg): Add test for Save/Load.
+  def Results(self):
+    results = ({'m1': [0.2, 1], 'm2': [0.1, 2]},
+               np.array([[0, 0.01], [0, 0]]),
+               np.array([[0, 0], [2, 0]], dtype=np.int32),
+               np.array([[0.2, 0.1], [0.1, 0.2]]))
+    return tasks.TaskResults(tasks.Task(), results)
+
+  def testSaveLoad(self):
+    res = self.Results()
+    with tempfile.TemporaryDirectory() as tmpdir:
+      filename = os.path.join(tmpdir, 'res')
+      res.Save(filename)
+      self.assertEqual(tasks.TaskResults().Load(filename), res)
+
+  def testLoadLegacyFormat(self):
+    res = self.Results()
+    with tempfile.TemporaryDirectory() as tmpdir:
+      filename = os.path.join(tmpdir, 'res')
+      with open(f'{filename}.json', 'w') as f:
+        json.dump(
+            (res.name, res.pval, res.corr_ranks, res.matrix.tolist()), f)
+      with open(f'{filename}.npz', 'wb') as f:
+        np.savez_compressed(
+            f, draws_index=res.draws_index, draws_list=res.draws_list)
+      self.assertEqual(tasks.TaskResults().Load(filename), res)
+
+  def testLegacyAttrVals(self):
+    # Results saved before early_conf and precision were added to Task.
+    legacy_results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+      for lang in 'en-de', 'zh-en':
+        res = self.Results()
+        res.name = ' '.join(
+            av for av in tasks.Task(lang=lang).name.split()
+            if not av.startswith(('early_conf=', 'precision=')))
+        filename = os.path.join(tmpdir, lang)
+        with open(f'{filename}.json', 'w') as f:
+          json.dump(
+              (res.name, res.pval, res.corr_ranks, res.matrix.tolist()), f)
+        with open(f'{filename}.npz', 'wb') as f:
+          np.savez_compressed(
+              f, draws_index=res.draws_index, draws_list=res.draws_list)
+        legacy_results.append(tasks.TaskResults().Load(filename))
+
+    self.assertEqual(legacy_results[0].attr_vals['early_conf'], '0.0')
+    self.assertEqual(legacy_results[0].attr_vals['precision'], 'float64')
+    self.assertEqual(
+        legacy_results[0].attr_vals, tasks.TaskResults(tasks.Task()).attr_vals)
+    results = tasks.TaskSetResults(legacy_results)
+    self.assertEqual(results.AssignWeights(tasks.Attributes()), [0.5, 0.5])
+    self.assertEqual(list(results.SplitByAttr('early_conf')), ['0.0'])
+    self.assertEqual(list(results.SplitByAttr('precision')), ['float64'])
+
+  def testFloat32Precision(self):
+    results = ({'m1': [0.2, 1], 'm2': [0.1, 1]},
+               np.array([[0, 0.05], [0, 0]]),
+               np.array([[0, 0], [2, 0]], dtype=np.int32),
+               np.array([[0.2, 0.1], [0.1, 0.2]]))
+    res = tasks.TaskResults(tasks.Task(precision='float32'), results)
+    self.assertEqual(res.matrix.dtype, np.float32)
+    self.assertEqual(res.draws_list.dtype, np.float32)
+    self.assertFalse(res.Sig(0, 1))  # p-value equal to pval isn't significant.
+    with tempfile.TemporaryDirectory() as tmpdir:
+      filename = os.path.join(tmpdir, 'res')
+      res.Save(filename)
+      loaded = tasks.TaskResults().Load(filename)
+      self.assertEqual(loaded, res)
+      self.assertEqual(loaded.matrix.dtype, np.float32)
+
+  def testLargeArraysOnDisk(self):
+    k = 100000  # Draws list is over the in-memory size limit.
+    results = ({'m1': [0.2, 1], 'm2': [0.1, 2]},
+               np.array([[0, 0.01], [0, 0]]),
+               np.array([[0, 0], [k, 0]], dtype=np.int32),
+               np.random.rand(k, 2))
+    res = tasks.TaskResults(tasks.Task(), results)
+    self.assertIsInstance(res.draws_list, np.memmap)
+    self.assertNotIsInstance(res.matrix, np.memmap)
+    np.testing.assert_array_equal(res.draws_list, results[3])
+    np.testing.assert_array_equal(res.Draws('m2', 'm1'), results[3][:, [1, 0]])
+    self.assertTrue(res.Sig('m1', 'm2'))
+
+    self.assertEqual(pickle.loads(pickle.dumps(res)), res)
+    with tempfile.TemporaryDirectory() as tmpdir:
+      filename = os.path.join(tmpdir, 'res')
+      res.Save(filename)
+      self.assertEqual(tasks.TaskResults().Load(filename), res)
+
+    path = res._draws_list.path
+    self.assertTrue(os.path.exists(path))
+    del res
+    gc.collect()
+    self.assertFalse(os.path.exists(path))
 
   def testAttrVals(self):
     task = tasks.Task()
@@ -172,6 +269,15 @@ class TaskSetTest(unittest.TestCase):
     ref_acc = tasks.Task(corr_fcn='accuracy', k=1).Run()
     self.assertEqual(res.results[1].metrics, ref_acc.metrics)
 
+  def testRunParallel(self):
+    taskset = tasks.TaskSet({'corr_fcn': ['pearson', 'accuracy']}, k=1)
+    res = taskset.Run()
+    parallel_res = taskset.Run(max_workers=2)
+    self.assertEqual(len(parallel_res), 2)  # pylint: disable=g-generic-assert
+    for r, pr in zip(res, parallel_res):
+      self.assertEqual(r.name, pr.name)
+      self.assertEqual(r.metrics, pr.metrics)
+
 
 class TaskSetResultsTest(unittest.TestCase):
 
@@ -218,6 +324,20 @@ class TaskSetResultsTest(unittest.TestCase):
     self.assertEqual(list(ranks.values()), sorted(ranks.values()))
     self.assertTrue(all(r >= 1 for r in ranks.values()))
 
+  def testAverageRanksWithMissingMetrics(self):
+    corr_ranks = [
+        {'m1': (0.9, 1), 'm2': (0.8, 2), 'm3': (0.7, 2), 'm4': (0.1, 3)},
+        {'m3': (0.9, 1), 'm2': (0.5, 2), 'm1': (0.4, 3)},
+        {'m2': (0.6, 1), 'm1': (0.5, 1), 'm3': (0.1, 2)},
+    ]
+    results = tasks.TaskSetResults([
+        tasks.TaskResults(None, (c, None, None, None)) for c in corr_ranks])
+    ranks = results.AverageRanks([0.5, 0.25, 0.25])
+    self.assertEqual(list(ranks), ['m1', 'm2', 'm3'])
+    self.assertAlmostEqual(ranks['m1'], 1.5)
+    self.assertAlmostEqual(ranks['m2'], 1.75)
+    self.assertAlmostEqual(ranks['m3'], 1.75)
+
   def testAverageCorrs(self):
     results = self.Results()
     corrs = results.AverageCorrs()
@@ -1,17 +1,51 @@
 import os
 import argparse
 from collections import defaultdict
+import math
 from pathlib import Path
 import shutil
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
 
 def read_lines(file):
-    with open(file, encoding='utf-8') as f:
-        return [line.rstrip('\n') for line in f]
+    lines = Path(file).read_text(encoding='utf-8').split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    return lines
+
+def read_lines_bytes(file):
+    # Same lines as read_lines, including its newline handling, but left undecoded
+    data = Path(file).read_bytes().replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+    lines = data.split(b'\n')
+    if lines[-1] == b'':
+        lines.pop()
+    return lines
+
+def read_scores(file):
+    lines = read_lines(file)
+    fields = '\t'.join(lines).split('\t')
+    assert len(fields) == 2 * len(lines), f"Expected 2 tab-separated fields per line in {file}"
+
+    # Stream fields straight into typed arrays, with systems numbered in order
+    # of first appearance
+    system_ids = {}
+    sys_ids = np.fromiter((system_ids.setdefault(system.strip(), len(system_ids)) for system in fields[0::2]),
+                          dtype=np.intp, count=len(lines))
+    scores = np.fromiter((math.nan if score.strip() == 'None' else float(score) for score in fields[1::2]),
+                         dtype=np.float64, count=len(lines))
+    return list(system_ids), sys_ids, scores
 
 def write_lines(file, lines):
     with open(file, 'w', encoding='utf-8') as f:
-        for line in lines:
-            f.write(line + '\n')
+        if lines:
+            f.write('\n'.join(lines) + '\n')
+
+def write_lines_bytes(file, lines):
+    with open(file, 'wb') as f:
+        if lines:
+            f.write(b'\n'.join(lines) + b'\n')
 
 def parse_args():
     parser = argparse.ArgumentParser()
@@ -19,62 +53,63 @@ def parse_args():
     parser.add_argument("--lp", required=True, help="e.g., en-de")
     parser.add_argument("--mtme_data_path", required=True, help="e.g., ~/.mt-metrics-eval/mt-metrics-eval-v2/")
     parser.add_argument("--type", required=True, help="e.g., mqm or esa")
+    parser.add_argument("--max_workers", type=int, default=1, help="processes for merging system outputs, e.g., 8")
     return parser.parse_args()
 
 def build_segment_to_doc_map(docs_lines):
     doc_map = defaultdict(list)
-    seg_to_doc = {}
     for idx, line in enumerate(docs_lines):
         domain, doc_id = line.split('\t')
-        full_doc_id = f"{domain}__{doc_id}"
-        doc_map[full_doc_id].append(idx)
-        seg_to_doc[idx] = full_doc_id
-    return doc_map, seg_to_doc
-
-def merge_text_lines_by_map(lines, doc_map):
-    merged = {}
-    for doc_id, indices in doc_map.items():
-        merged[doc_id] = "\n".join([lines[i] for i in indices])
-    return merged
-
-def merge_scores_by_map(score_lines, doc_map):
-    merged = defaultdict(lambda: defaultdict(list))
-    for line in score_lines:
-        system, score = line.strip().split('\t')
-        score = float(score) if score != 'None' else 'None'
-        seg_id = merge_scores_by_map.seg_counter % merge_scores_by_map.total_segments
-        doc_id = merge_scores_by_map.seg_to_doc[seg_id]
-        merged[system][doc_id].append(score)
-        merge_scores_by_map.seg_counter += 1
-    merged_scores = defaultdict(lambda: defaultdict(float))
-    count = 0
-    for system in merged.keys():
-        for doc_id in merged[system].keys():
-            try:
-                merged_scores[system][doc_id] = sum(merged[system][doc_id])
-                # tmp = [x for x in merged[system][doc_id] if x != 'None']
-                # assert len(tmp) != 0
-                # merged_scores[system][doc_id] = sum(tmp)
-            except:
-                for seg in merged[system][doc_id]:
-                    try:
-                        assert seg == 'None'
-                    except:
-                        count += 1
-                        # print(doc_id, system, merged[system][doc_id])
-                        break
-                merged_scores[system][doc_id] = 'None'
+        doc_map[f"{domain}__{doc_id}"].append(idx)
+    return doc_map
+
+def merge_file(in_path, out_path, index_groups):
+    # Text is copied verbatim, so it is never decoded
+    lines = read_lines_bytes(in_path)
+    assert len(lines) == sum(len(indices) for indices in index_groups), f"Mismatch in line count for {in_path}"
+    write_lines_bytes(out_path, [b"\n".join([lines[i] for i in indices]) for indices in index_groups])
+
+def merge_scores_by_map(systems, sys_ids, scores, doc_map, total_segments):
+    seg_ids = np.arange(len(scores)) % total_segments
+
+    # One column of segment scores per system, NaN for 'None'.
+    seg_scores = np.full((total_segments, len(systems)), np.nan)
+    seg_scores[seg_ids, sys_ids] = scores
+
+    # Make each document's segments contiguous, then sum them one position at a
+    # time across all documents, adding segments in order as a plain sum()
+    # would. A document with any 'None' segment gets a NaN sum, which is
+    # written out as 'None'.
+    doc_sizes = np.array([len(indices) for indices in doc_map.values()])
+    offsets = np.r_[0, np.cumsum(doc_sizes)[:-1]]
+    seg_scores = seg_scores[np.concatenate(list(doc_map.values()))]
+    doc_sums = np.zeros((len(doc_sizes), len(systems)))
+    for pos in range(doc_sizes.max()):
+        in_doc = doc_sizes > pos
+        doc_sums[in_doc] += seg_scores[offsets[in_doc] + pos]
+    none_counts = np.add.reduceat(np.isnan(seg_scores), offsets, axis=0, dtype=np.int64)
+    count = np.count_nonzero((none_counts > 0) & (none_counts < doc_sizes[:, None]))
     print(f"defaulted to None on {count} docs")
+
+    merged_scores = {}
+    for system, sums in zip(systems, doc_sums.T.tolist()):
+        merged_scores[system] = {
+            doc_id: 'None' if math.isnan(total) else total
+            for doc_id, total in zip(doc_map, sums)
+        }
     return merged_scores
 
-def merge_system_outputs(system_dir, output_dir, doc_map):
+def merge_system_outputs(system_dir, output_dir, index_groups, max_workers=1):
     os.makedirs(output_dir, exist_ok=True)
-    for system_file in Path(system_dir).glob("*"):
-        lines = read_lines(system_file)
-        assert len(lines) == merge_system_outputs.total_segments
-        merged = merge_text_lines_by_map(lines, doc_map)
-        out_file = output_dir / system_file.name
-        write_lines(out_file, [merged[doc_id] for doc_id in sorted(merged)])
+    system_files = list(Path(system_dir).glob("*"))
+    out_files = [output_dir / system_file.name for system_file in system_files]
+    if max_workers == 1 or len(system_files) <= 1:
+        for system_file, out_file in zip(system_files, out_files):
+            merge_file(system_file, out_file, index_groups)
+    else:
+        # max_workers=None uses one process per CPU
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(merge_file, system_files, out_files, repeat(index_groups)))
 
 def main():
     args = parse_args()
@@ -88,46 +123,38 @@ def main():
 
     # Step 1: Build segment to document mapping
     docs_lines = read_lines(docs_file)
-    doc_map, seg_to_doc = build_segment_to_doc_map(docs_lines)
+    doc_map = build_segment_to_doc_map(docs_lines)
     total_segments = len(docs_lines)
     print(f"✅ Loaded {total_segments} segment mappings into {len(doc_map)} documents.")
 
+    # Output documents are written in sorted doc id order
+    sorted_doc_ids = sorted(doc_map)
+    index_groups = [doc_map[doc_id] for doc_id in sorted_doc_ids]
+
     # Step 2: Merge sources
-    source_lines = read_lines(sources_file)
-    assert len(source_lines) == total_segments
-    merged_sources = merge_text_lines_by_map(source_lines, doc_map)
-    write_lines(base_path / "sources" / f"{out_lp}.txt", [merged_sources[doc_id] for doc_id in sorted(merged_sources)])
+    merge_file(sources_file, base_path / "sources" / f"{out_lp}.txt", index_groups)
 
     # Step 3: Merge references
-    ref_lines = read_lines(references_file)
-    assert len(ref_lines) == total_segments
-    merged_refs = merge_text_lines_by_map(ref_lines, doc_map)
-    write_lines(base_path / "references" / f"{out_lp}.refA.txt", [merged_refs[doc_id] for doc_id in sorted(merged_refs)])
+    merge_file(references_file, base_path / "references" / f"{out_lp}.refA.txt", index_groups)
 
     # Step 4: Merge scores
-    score_lines = read_lines(scores_file)
-    systems = set(line.split('\t')[0] for line in score_lines)
+    systems, sys_ids, scores = read_scores(scores_file)
     expected_lines = len(systems) * total_segments
-    assert len(score_lines) == expected_lines, "Mismatch in score lines vs expected lines"
+    assert len(scores) == expected_lines, "Mismatch in score lines vs expected lines"
 
-    merge_scores_by_map.total_segments = total_segments
-    merge_scores_by_map.seg_counter = 0
-    merge_scores_by_map.seg_to_doc = seg_to_doc
-    merged_scores = merge_scores_by_map(score_lines, doc_map)
+    merged_scores = merge_scores_by_map(systems, sys_ids, scores, doc_map, total_segments)
 
-    with open(base_path / "human-scores" / f"{out_lp}.{args.type}.seg.score", 'w') as out_f:
-        for system in sorted(merged_scores.keys()):
-            for doc_id in sorted(merged_scores[system].keys()):
-                out_f.write(f"{system}\t{merged_scores[system][doc_id]}\n")
+    score_lines = [f"{system}\t{merged_scores[system][doc_id]}"
+                   for system in sorted(merged_scores) for doc_id in sorted_doc_ids]
+    write_lines(base_path / "human-scores" / f"{out_lp}.{args.type}.seg.score", score_lines)
 
     # Step 5: Merge system outputs
     system_out_dir = base_path / "system-outputs" / out_lp
-    merge_system_outputs.total_segments = total_segments
-    merge_system_outputs(doc_map=doc_map, system_dir=systems_dir, output_dir=system_out_dir)
+    merge_system_outputs(system_dir=systems_dir, output_dir=system_out_dir, index_groups=index_groups, max_workers=args.max_workers)
 
     # Step 6: Merge .docs file
     merged_docs_lines = []
-    for doc_id in sorted(doc_map):
+    for doc_id in sorted_doc_ids:
         domain, raw_doc_id = doc_id.split('__', 1)
         merged_docs_lines.append(f"{domain}\t{raw_doc_id}")
     write_lines(base_path / "documents" / f"{out_lp}.docs", merged_docs_lines)
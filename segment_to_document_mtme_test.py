@@ -0,0 +1,79 @@
+import contextlib
+import io
+from pathlib import Path
+import tempfile
+import unittest
+
+import segment_to_document_mtme as s2d
+
+class SegmentToDocumentTest(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmp_path = Path(tmpdir.name)
+
+    def testBuildSegmentToDocMap(self):
+        docs_lines = ["news\td1", "news\td2", "news\td1", "chat\td1"]
+        doc_map = s2d.build_segment_to_doc_map(docs_lines)
+        self.assertEqual(dict(doc_map), {"news__d1": [0, 2], "news__d2": [1], "chat__d1": [3]})
+        self.assertEqual(list(doc_map), ["news__d1", "news__d2", "chat__d1"])
+
+    def testMergeScoresByMap(self):
+        doc_map = s2d.build_segment_to_doc_map(["news\td1", "news\td2", "news\td1", "chat\td1"])
+        # Scores are in one block of segments per system.
+        scores = {
+            "sysA": ["0.1", "0.2", "0.7", "None"],  # chat__d1 is all None
+            "sysB": ["None", "1.5", "-2", "3"],     # news__d1 is partly None
+        }
+        scores_file = self.tmp_path / "scores"
+        s2d.write_lines(scores_file, [f"{system}\t{score}" for system in scores for score in scores[system]])
+        systems, sys_ids, seg_scores = s2d.read_scores(scores_file)
+        self.assertEqual(systems, ["sysA", "sysB"])
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            merged = s2d.merge_scores_by_map(systems, sys_ids, seg_scores, doc_map, total_segments=4)
+        self.assertEqual(out.getvalue(), "defaulted to None on 1 docs\n")
+        self.assertEqual(merged, {
+            "sysA": {"news__d1": sum([0.1, 0.7]), "news__d2": 0.2, "chat__d1": "None"},
+            "sysB": {"news__d1": "None", "news__d2": 1.5, "chat__d1": 3.0},
+        })
+
+    def testMergeScoresSumsInSegmentOrder(self):
+        values = [0.1, 0.2, 0.3, 1e16, -1e16, 0.7]
+        doc_map = s2d.build_segment_to_doc_map(["news\td1"] * len(values))
+        scores_file = self.tmp_path / "scores"
+        s2d.write_lines(scores_file, [f"sys\t{value!r}" for value in values])
+        systems, sys_ids, scores = s2d.read_scores(scores_file)
+        with contextlib.redirect_stdout(io.StringIO()):
+            merged = s2d.merge_scores_by_map(systems, sys_ids, scores, doc_map, len(values))
+        self.assertEqual(merged, {"sys": {"news__d1": sum(values)}})
+
+    def testMergeFile(self):
+        in_path, out_path = self.tmp_path / "in.txt", self.tmp_path / "out.txt"
+        # Mixed line endings and text that isn't valid UTF-8 are kept as is.
+        in_path.write_bytes(b"a\r\nb\n\xff c\rd\n")
+        s2d.merge_file(in_path, out_path, [[0, 2], [1], [3]])
+        self.assertEqual(out_path.read_bytes(), b"a\n\xff c\nb\nd\n")
+
+    def testMergeFileChecksLineCount(self):
+        in_path = self.tmp_path / "in.txt"
+        in_path.write_bytes(b"a\nb\n")
+        with self.assertRaises(AssertionError):
+            s2d.merge_file(in_path, self.tmp_path / "out.txt", [[0, 1], [2]])
+
+    def testMergeSystemOutputs(self):
+        system_dir, output_dir = self.tmp_path / "systems", self.tmp_path / "merged"
+        system_dir.mkdir()
+        for system in "sysA", "sysB":
+            (system_dir / f"{system}.txt").write_bytes(f"{system} 0\n{system} 1\n{system} 2\n".encode())
+        for max_workers in 1, 2:
+            s2d.merge_system_outputs(system_dir, output_dir, [[2, 0], [1]], max_workers=max_workers)
+            for system in "sysA", "sysB":
+                self.assertEqual((output_dir / f"{system}.txt").read_text(),
+                                 f"{system} 2\n{system} 0\n{system} 1\n")
+
+
+if __name__ == "__main__":
+    unittest.main()